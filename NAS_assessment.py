@@ -1,20 +1,87 @@
-import csv, json, os, re
+import bisect, csv, html, json, os, re, sys
 from typing import Iterable
+import importlib.util
 import unittest
 import fnmatch
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Buffer size used for data file I/O
+IO_BUF = 1 << 20
+# Smallest csv data file worth parsing with pyarrow rather than the csv module
+ARROW_CSV_MIN_SIZE = 64 << 10
+
+
+# pyarrow module once imported, False if it is not installed, None until first needed
+_pyarrow = None
+
+
+def _importPyarrow():
+    """
+    returns the pyarrow module, or False if it is not installed.
+    Only large csv files need it, so it is imported on first use.
+    """
+    global _pyarrow
+    if _pyarrow is None:
+        try:
+            import pyarrow
+            import pyarrow.csv
+            _pyarrow = pyarrow
+        except ImportError:
+            _pyarrow = False
+    return _pyarrow
+
+
+def _stat(fName: str):
+    """ returns the os.stat result for fName, or None if there is no such file """
+    try:
+        return os.stat(fName)
+    except FileNotFoundError:
+        return None
+
+
+# JSON serialization, using orjson when it is installed.
+# Both variants produce the same layout (two space indentation).
+if orjson is not None:
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+    _loads = orjson.loads
+else:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, indent=2).encode()
+
+    _loads = json.loads
+
+
 #  Database
 class Record(dict):
-    categories = ["name", "address", "phone number"]
+    # No per-instance __dict__ or __weakref__, records only hold their items
+    __slots__ = ()
+    categories = ("name", "address", "phone number")
+    categorySet = frozenset(categories)
+    categoryOptions = ", ".join(categories)
+
+    @classmethod
+    def interned(cls, items: Iterable) -> "Record":
+        """
+        Creates a record from (key, value) pairs, interning string values so
+        values repeated across records share a single string object
+        """
+        intern = sys.intern
+        return cls((key, intern(value) if type(value) is str else value) for key, value in items)
 
     def __str__(self):
         """ Overwrite dict string representation for a nicer output formatting """
-        output = ""
-        for key, value in self.items():
-            key += ":"
-            output += f"{key:<15} {value}\n"
-        output = output.strip()
-        return output
+        return "\n".join(f"{key + ':':<15} {value}" for key, value in self.items()).strip()
 
 
 class Format():
@@ -29,7 +96,11 @@ class Format():
     def getName(self):
         return self.name
 
-    def write(self, record: "Record", fName: str) -> bool:
+    def write(self, record: "Record", fName: str, fileEmpty: bool = None) -> bool:
+        raise NotImplementedError
+        return False
+
+    def writeMany(self, records: list, fName: str, fileEmpty: bool = None) -> bool:
         raise NotImplementedError
         return False
 
@@ -37,13 +108,19 @@ class Format():
         raise NotImplementedError
         return []
 
+    def iterRecords(self, fName: str) -> Iterable:
+        raise NotImplementedError
+        return iter([])
+
+    def stored(self, record: "Record") -> "Record":
+        """ Returns the record as getRecords reads it back once written """
+        raise NotImplementedError
+        return record
+
     @staticmethod
     def __configFormats() -> dict:
-        """	New storage formats get added here.	"""
-        formats = {}
-        formats['csv'] = CSVFormat()
-        formats['json'] = JSONFormat()
-        return formats
+        """ Formats hold no state, so every caller shares the same instances """
+        return _FORMATS
 
     @staticmethod
     def getFormats() -> dict:
@@ -54,21 +131,45 @@ class CSVFormat(Format):
     def __init__(self):
         super().__init__("csv")
 
-    def write(self, record: Record, fName: str) -> bool:
+    def write(self, record: Record, fName: str, fileEmpty: bool = None) -> bool:
         """
         Writes a record into the csv data file
         """
+        return self.writeMany([record], fName, fileEmpty)
+
+    def writeMany(self, records: list, fName: str, fileEmpty: bool = None) -> bool:
+        """
+        Writes a list of records into the csv data file with a single open
+
+        fileEmpty tells whether the data file is missing or empty,
+        it is looked up when the caller does not already know
+        """
         success = False
-        exists = os.path.isfile(fName)
-        with open(fName, 'a', newline='') as f:
+        if fileEmpty is None:
+            stat = _stat(fName)
+            fileEmpty = stat is None or stat.st_size == 0
+        with open(fName, 'a', newline='', buffering=IO_BUF) as f:
             writer = csv.writer(f)
-            if not exists:
+            if fileEmpty:
                 writer.writerow(Record.categories)
-            writer.writerow(record.values())
+            writer.writerows(CSVFormat.__row(record) for record in records)
             success = True
 
         return success
 
+    @staticmethod
+    def __row(record: Record) -> list:
+        """ Lays the record out in category order, missing categories are left empty """
+        return [record.get(category, "") for category in Record.categories]
+
+    def stored(self, record: Record) -> Record:
+        """
+        Returns the record as getRecords reads it back once written,
+        with every category present and every value a string
+        """
+        return Record(zip(Record.categories, (
+            sys.intern("" if value is None else str(value)) for value in CSVFormat.__row(record))))
+
     def getRecords(self, fName: str) -> list:
         """
         Reads all of the entries in the csv data file and
@@ -76,39 +177,128 @@ class CSVFormat(Format):
 
         Returns an empty list if no data or data file present
         """
-        records = []
-        if os.path.isfile(fName):
-            with open(fName, 'r') as f:
-                reader = csv.reader(f)
-                next(reader)
-                for row in reader:
-                    record = Record()
-                    for index, value in enumerate(row):
-                        record[Record.categories[index]] = value
-                    records.append(record)
-        return records
+        try:
+            f = open(fName, 'r', newline='', buffering=IO_BUF)
+        except FileNotFoundError:
+            return []
+        with f:
+            if _pyarrow is not False and os.fstat(f.fileno()).st_size >= ARROW_CSV_MIN_SIZE:
+                pyarrow = _importPyarrow()
+                if pyarrow:
+                    try:
+                        return CSVFormat.__arrowRecords(pyarrow, fName)
+                    except pyarrow.ArrowInvalid:
+                        pass
+            reader = csv.reader(f)
+            next(reader, None)
+            categories = Record.categories
+            return [Record(zip(categories, map(sys.intern, row))) for row in reader]
+
+    @staticmethod
+    def __arrowRecords(pyarrow, fName: str) -> list:
+        """
+        Parses the csv data file with pyarrow, reading every column as strings
+
+        Raises pyarrow.ArrowInvalid for files pyarrow cannot parse,
+        such as rows with a different number of fields
+        """
+        categories = Record.categories
+        table = pyarrow.csv.read_csv(
+            fName,
+            read_options=pyarrow.csv.ReadOptions(
+                column_names=list(categories), skip_rows=1, block_size=IO_BUF),
+            parse_options=pyarrow.csv.ParseOptions(newlines_in_values=True),
+            convert_options=pyarrow.csv.ConvertOptions(
+                column_types={category: pyarrow.string() for category in categories}))
+        columns = [map(sys.intern, table.column(category).to_pylist()) for category in categories]
+        return [Record(zip(categories, row)) for row in zip(*columns)]
+
+    def iterRecords(self, fName: str) -> Iterable:
+        """
+        Yields the entries in the csv data file one record at a time
+
+        Yields nothing if no data or data file present
+        """
+        try:
+            f = open(fName, 'r', newline='', buffering=IO_BUF)
+        except FileNotFoundError:
+            return
+        with f:
+            reader = csv.reader(f)
+            next(reader, None)
+            categories = Record.categories
+            for row in reader:
+                yield Record(zip(categories, map(sys.intern, row)))
 
 
 class JSONFormat(Format):
     def __init__(self):
         super().__init__("json")
 
-    def write(self, record: Record, fName: str) -> bool:
+    def write(self, record: Record, fName: str, fileEmpty: bool = None) -> bool:
         """
         Writes a record into the json data file
         """
+        return self.writeMany([record], fName, fileEmpty)
+
+    def writeMany(self, records: list, fName: str, fileEmpty: bool = None) -> bool:
+        """
+        Writes a list of records into the json data file with a single open
+
+        The records are spliced in before the closing brackets of the records
+        array, so existing records are never re-read or re-serialized.
+        fileEmpty tells whether the data file is missing or empty,
+        it is looked up when the caller does not already know
+        """
         success = False
-        if not os.path.isfile(fName):
-            with open(fName, "w") as f:
-                json.dump({"records": []}, f, indent=4)
-        with open(fName, "r+") as f:
-            data = json.load(f)
-            data["records"].append(record)
-            f.seek(0)
-            json.dump(data, f, indent=4)
+        if fileEmpty is None:
+            stat = _stat(fName)
+            fileEmpty = stat is None or stat.st_size == 0
+        if fileEmpty:
+            with open(fName, "wb", buffering=IO_BUF) as f:
+                f.write(_dumps({"records": records}))
+            return True
+        if not records:
+            return True
+        with open(fName, "r+b", buffering=IO_BUF) as f:
+            pos, char = JSONFormat.__skipBack(f, f.seek(0, os.SEEK_END))
+            if char != b"}":
+                return success
+            pos, char = JSONFormat.__skipBack(f, pos)
+            if char != b"]":
+                return success
+            pos, char = JSONFormat.__skipBack(f, pos)
+            if char not in (b"[", b"}"):
+                return success
+            entries = b",\n".join(
+                b"    " + _dumps(record).replace(b"\n", b"\n    ") for record in records)
+            separator = b"\n" if char == b"[" else b",\n"
+            f.seek(pos + 1)
+            f.truncate()
+            f.write(separator + entries + b"\n  ]\n}")
             success = True
         return success
 
+    @staticmethod
+    def __skipBack(f, pos: int) -> tuple:
+        """
+        Steps backwards from pos over whitespace
+
+        Returns a tuple containing (position, byte) of the first
+        non-whitespace byte found, or (-1, b"") at the start of the file
+        """
+        while pos > 0:
+            pos -= 1
+            f.seek(pos)
+            char = f.read(1)
+            if not char.isspace():
+                return pos, char
+        return -1, b""
+
+    def stored(self, record: Record) -> Record:
+        """ Returns the record as getRecords reads it back once written """
+        return Record.interned(record.items())
+
     def getRecords(self, fName: str) -> list:
         """
         Reads all of the entries in the json data file and
@@ -116,13 +306,37 @@ class JSONFormat(Format):
 
         Returns an empty list if no data or data file present
         """
-        if os.path.isfile(fName):
-            with open(fName, "r") as f:
-                data = json.load(f)
-                key = list(data.keys())[0]
-                records = [Record(record) for record in data[key]]
-                return records
-        return []
+        try:
+            f = open(fName, "rb", buffering=IO_BUF)
+        except FileNotFoundError:
+            return []
+        with f:
+            data = _loads(f.read())
+        return [Record.interned(record.items()) for record in data["records"]]
+
+    def iterRecords(self, fName: str) -> Iterable:
+        """
+        Yields the entries in the json data file one record at a time.
+        Without ijson installed the whole file is parsed up front.
+
+        Yields nothing if no data or data file present
+        """
+        if ijson is None:
+            yield from self.getRecords(fName)
+            return
+        try:
+            f = open(fName, "rb", buffering=IO_BUF)
+        except FileNotFoundError:
+            return
+        with f:
+            for record in ijson.items(f, "records.item", use_float=True):
+                yield Record.interned(record.items())
+
+# New storage formats get added here.
+_FORMATS = {
+    'csv': CSVFormat(),
+    'json': JSONFormat(),
+}
 
 class Display:
     """
@@ -136,12 +350,16 @@ class Display:
         TODO: add an option for the user to launch a subprocess to open the data in the browser
 
         """
-        with open(f"html_display.html", 'w') as f:
-            for record in data:
-                f.write("<ul>")
-                for key, value in record.items():
-                    f.write(f"<li>{key}: {value}</li>")
-                f.write("</ul><hr>")
+        parts = []
+        append = parts.append
+        escape = html.escape
+        for record in data:
+            append("<ul>")
+            append("".join(
+                f"<li>{escape(str(key))}: {escape(str(value))}</li>" for key, value in record.items()))
+            append("</ul><hr>")
+        with open(f"html_display.html", 'w', buffering=IO_BUF) as f:
+            f.write("".join(parts))
         print("html file created!")
 
     @staticmethod
@@ -163,7 +381,62 @@ class Display:
             f.write("end of records" + ("*" * (starCount - 14)))
         print("text file created!")
 
+class PrefixIndex():
+    """
+    Values of one record category kept in sorted order, so the values
+    starting with a given prefix form one contiguous range found by bisection
+    """
+
+    def __init__(self, values: Iterable = ()):
+        values = list(values)
+        self.rows = sorted(range(len(values)), key=values.__getitem__)
+        self.values = [values[row] for row in self.rows]
+
+    def insert(self, value: str):
+        """ Adds the value of the next row to the index """
+        position = bisect.bisect_right(self.values, value)
+        self.rows.insert(position, len(self.values))
+        self.values.insert(position, value)
+
+    def find(self, prefix: str) -> list:
+        """ returns the row numbers, in file order, of all values starting with a non-empty prefix """
+        start = bisect.bisect_left(self.values, prefix)
+        end = len(self.values)
+        upper = prefix.rstrip(chr(sys.maxunicode))
+        if upper:
+            # the first string sorting after every string that starts with prefix
+            end = bisect.bisect_left(self.values, upper[:-1] + chr(ord(upper[-1]) + 1), start)
+        return sorted(self.rows[start:end])
+
+
+class ValueIndex():
+    """ Maps every value of one record category to its row numbers, in file order """
+
+    def __init__(self, values: Iterable = ()):
+        self.rows = {}
+        self.size = 0
+        for value in values:
+            self.insert(value)
+
+    def insert(self, value: str):
+        """ Adds the value of the next row to the index """
+        self.rows.setdefault(value, []).append(self.size)
+        self.size += 1
+
+    def find(self, value: str) -> list:
+        """ returns the row numbers of all occurrences of value """
+        return self.rows.get(value, [])
+
+
 class Database():
+    # Glob patterns of the form "prefix*", which can be answered by a PrefixIndex
+    prefixGlob = re.compile(r"[^*?\[,]+\*")
+    # Building an index costs a few scans, so a category is only indexed
+    # once this many searches on it have been answered by scanning
+    scansBeforeIndex = 4
+    # Glob patterns without wildcards, which can be answered by a ValueIndex
+    exactGlob = re.compile(r"[^*?\[]*")
+
     def __init__(self, fileName, fileFormat):
         self.formats = Format.getFormats()
         self.currentFormat = fileFormat
@@ -171,6 +444,10 @@ class Database():
         if self.currentFormat not in self.formats.keys():
             print ('ERROR: file format {} is not supported'.format(self.currentFormat))
         self.dataFile = f"{fileName}.{self.currentFormat}"
+        self._cache = None
+        self._cacheKey = None
+        self._indexes = {}
+        self._scanCounts = {}
 
     def add(self, newRecord: Record) -> bool:
         """
@@ -179,7 +456,12 @@ class Database():
 
         Returns success status
         """
-        return self.formats[self.currentFormat].write(newRecord, f"{self.dataFile}")
+        stat = _stat(self.dataFile)
+        cacheValid = self._cache is not None and self.__statKey(stat) == self._cacheKey
+        fileEmpty = stat is None or stat.st_size == 0
+        success = self.formats[self.currentFormat].write(newRecord, self.dataFile, fileEmpty)
+        self.__recordsWritten([newRecord], success and cacheValid)
+        return success
 
     def importRecords(self, fName: str) -> bool:
         """
@@ -187,13 +469,18 @@ class Database():
 
         Returns success status
         """
-        success = False
-        format = fName.strip().split('.')[1]
-        if format in self.formats.keys():
-            records = self.formats[format].getRecords(fName)
-            for record in records:
-                self.formats[self.currentFormat].write(record, self.dataFile)
-            success = True
+        fName = fName.strip()
+        sourceFormat = self.formats.get(os.path.splitext(fName)[1][1:].lower())
+        if sourceFormat is None:
+            return False
+        records = sourceFormat.getRecords(fName)
+        if not records:
+            return _stat(fName) is not None
+        stat = _stat(self.dataFile)
+        cacheValid = self._cache is not None and self.__statKey(stat) == self._cacheKey
+        fileEmpty = stat is None or stat.st_size == 0
+        success = self.formats[self.currentFormat].writeMany(records, self.dataFile, fileEmpty)
+        self.__recordsWritten(records, success and cacheValid)
         return success
 
     def convert(self, newFormat: str) -> bool:
@@ -204,21 +491,27 @@ class Database():
         """
         if newFormat == self.currentFormat:
             return True
-        if not os.path.isfile(self.dataFile):
+        if self.__fileKey() is None:
             self.currentFormat = newFormat
+            self.__dropCache()
             return True
         if newFormat in self.formats.keys():
-            originalRecords = self.formats[self.currentFormat].getRecords(self.dataFile)
+            originalRecords = self.__loadRecords()
             newFile = f"{self.fileName}.{newFormat}"
-            newDatabase = Database(self.fileName, newFormat)
-            if os.path.isfile(newFile):
+            try:
                 os.remove(newFile)
-            for record in originalRecords:
-                newDatabase.add(record)
-            if self.formats[newFormat].getRecords(newFile) == originalRecords:
+            except FileNotFoundError:
+                pass
+            newRecords = []
+            if self.formats[newFormat].writeMany(originalRecords, newFile):
+                newRecords = self.formats[newFormat].getRecords(newFile)
+            if len(newRecords) == len(originalRecords):
                 os.remove(self.dataFile)
                 self.currentFormat = newFormat
                 self.dataFile = newFile
+                self.__dropCache()
+                self._cache = newRecords
+                self._cacheKey = self.__fileKey()
                 return True
             else:
                 os.remove(newFile)
@@ -226,33 +519,146 @@ class Database():
         return False
 
     def getRecords(self) -> list:
-        """ returns a list containing all stored records"""
-        return self.formats[self.currentFormat].getRecords(self.dataFile)
+        """ returns a list containing copies of all stored records"""
+        return [Record(record) for record in self.__loadRecords()]
+
+    @staticmethod
+    def __statKey(stat):
+        """
+        returns a (modification time, size) tuple identifying the file
+        contents described by an os.stat result, or None if there is no file
+        """
+        if stat is None:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def __fileKey(self):
+        """
+        returns a (modification time, size) tuple identifying the current
+        contents of the data file, or None if there is no data file
+        """
+        return self.__statKey(_stat(self.dataFile))
+
+    def __loadRecords(self) -> list:
+        """
+        Returns the cached list of stored records, only re-reading the data
+        file if it changed since it was last read.  The list and its records
+        are shared with the cache, so they are copied before leaving the class.
+        """
+        key = self.__fileKey()
+        if key is None:
+            self.__dropCache()
+            return []
+        if self._cache is None or key != self._cacheKey:
+            self.__dropCache()
+            self._cache = self.formats[self.currentFormat].getRecords(self.dataFile)
+            self._cacheKey = key
+        return self._cache
+
+    def __recordsWritten(self, records: list, keepCache: bool):
+        """
+        Brings the cache up to date after records were written to the data file.
+        Records are cached as the format stores them, so a warm cache answers
+        the same as a fresh read.  The cache and indexes are extended in place when they were current
+        before the write and every record has the indexed categories, and
+        dropped otherwise so the next read reloads the file.
+        """
+        if keepCache:
+            stored = self.formats[self.currentFormat].stored
+            records = [stored(record) for record in records]
+        indexed = set(category for indexType, category in self._indexes)
+        if keepCache and all(indexed.issubset(record.keys()) for record in records):
+            self._cache.extend(records)
+            self._cacheKey = self.__fileKey()
+            for (indexType, category), index in self._indexes.items():
+                for record in records:
+                    index.insert(str(record[category]))
+        else:
+            self.__dropCache()
+
+    def __dropCache(self):
+        """ Forgets the cached records along with any index built from them """
+        self._cache = None
+        self._indexes = {}
+        self._scanCounts = {}
+
+    def __index(self, indexType: type, category: str, records: list):
+        """
+        Returns the indexType index over category for the cached records,
+        or None while scanning is still cheaper than building it
+        """
+        key = (indexType, category)
+        index = self._indexes.get(key)
+        if index is None:
+            scans = self._scanCounts.get(key, 0)
+            if scans < self.scansBeforeIndex:
+                self._scanCounts[key] = scans + 1
+                return None
+            if not all(category in record for record in records):
+                return None
+            index = indexType(str(record[category]) for record in records)
+            self._indexes[key] = index
+        return index
 
     def getCurrentFormat(self) -> tuple:
         """ returns a tuple containing (dict of formats, current format) """
         return self.currentFormat
 
     def __iter__(self):
-        """ Determines how a database gets iterated over """
-        for record in self.formats[self.currentFormat].getRecords(self.dataFile):
+        """
+        Determines how a database gets iterated over.
+        Yields copies of the cached records when they are current, and otherwise
+        streams them from the data file instead of loading them all into memory
+        """
+        if self._cache is not None and self.__fileKey() == self._cacheKey:
+            records = map(Record, self._cache)
+        else:
+            records = self.formats[self.currentFormat].iterRecords(self.dataFile)
+        for record in records:
             yield record
 
     def clean(self):
         """ Deletes the current data file"""
-        if os.path.isfile(self.dataFile):
+        try:
             os.remove(self.dataFile)
+        except FileNotFoundError:
+            pass
+        self.__dropCache()
 
     def filter(self, valueSelected, searchItem):
-        """ Filter the database using Glob syntax"""
+        """
+        Filter the database using Glob syntax, matching against each value's
+        string form.  Records without the selected category never match.
+        """
+        records = self.__loadRecords()
+        if self.prefixGlob.fullmatch(searchItem):
+            index = self.__index(PrefixIndex, valueSelected, records)
+            if index is not None:
+                return [Record(records[row]) for row in index.find(searchItem[:-1])]
+        if self.exactGlob.fullmatch(searchItem):
+            index = self.__index(ValueIndex, valueSelected, records)
+            if index is not None:
+                rows = set(index.find(searchItem))
+                if ',' in searchItem:
+                    for subItem in searchItem.split(','):
+                        rows.update(index.find(subItem.strip()))
+                return [Record(records[row]) for row in sorted(rows)]
+
         filterResults = []
-        for entry in self.getRecords():
-            if fnmatch.fnmatch(entry[valueSelected], searchItem):
-                filterResults.append(entry)
-            elif ',' in searchItem:
-                for subItem in searchItem:
-                    if entry[valueSelected] == subItem:
-                        filterResults.append(entry)
+        pattern = re.compile(fnmatch.translate(searchItem))
+        subItems = set()
+        if ',' in searchItem:
+            subItems = set(subItem.strip() for subItem in searchItem.split(','))
+        for entry in records:
+            if valueSelected not in entry:
+                continue
+            value = entry[valueSelected]
+            if type(value) is not str:
+                value = str(value)
+            if pattern.match(value) is not None:
+                filterResults.append(Record(entry))
+            elif value in subItems:
+                filterResults.append(Record(entry))
 
         return filterResults
 
@@ -313,13 +719,9 @@ class Interface():
                 print(f"Unable to import records from {fName}")
 
         elif command == "filter":
-            options = ""
-            for value in Record.categories:
-                options += f"{value}, "
-            options = options[:-2]
             valueSelected = input(
-                f"What are you searching for? Options: {options}\n>> ").strip().lower()
-            if valueSelected in Record.categories:
+                f"What are you searching for? Options: {Record.categoryOptions}\n>> ").strip().lower()
+            if valueSelected in Record.categorySet:
                 searchItem = input(f"Enter {valueSelected} to be found\n>>> ").strip()
                 records = self.database.filter(valueSelected, searchItem)
                 print("Results:")
@@ -332,7 +734,6 @@ class Interface():
 
         elif command == "display":
             displayFormat = input(f"Format? Options: console, text, html\n>> ").strip().lower()
-            self.database.formats[self.database.currentFormat].getRecords(self.fileName)
             if displayFormat == 'console':
                 self.__prettyPrint(self.database)
             elif displayFormat == 'text':
@@ -376,18 +777,14 @@ class Interface():
     def __listFormats(self):
         """ Helper function for when all available formats need to be printed for the user to see
         """
-        print(f"Current: {self.database.getCurrentFormat()}")
-        print("Available:", end=" ")
-        for availableFormats in Format.getFormats().keys():
-            print(availableFormats, end=" ")
-        print()
+        print(f"Current: {self.database.getCurrentFormat()}\n"
+              f"Available: {' '.join(Format.getFormats().keys())}")
 
     def __listCommands(self):
         """
         Helper function that prints information about the commands.
         When adding a command, make sure to update the valid commands list.
         """
-        print("  Valid Commmands:")
         validCommands = [
             ("help", "lists all valid commands"),
             ("add", "add a new entry to the database"),
@@ -399,14 +796,21 @@ class Interface():
             ("convert", "converts database from one format to another"),
             ("quit", "exit the command line interface")
         ]
-        for command, info in validCommands:
-            print(f"  {command:<12}{info}")
+        print("\n".join(["  Valid Commmands:"] + [
+            f"  {command:<12}{info}" for command, info in validCommands]))
         return
 
 
 #  Unit tests
 class T0_test_add_and_getRecords(unittest.TestCase):
 
+    @staticmethod
+    def sampleRecords(count: int = 3) -> list:
+        """ returns count distinct records for tests that need several """
+        return [Record(
+            {"name": f"John Doe {i}", "address": "123 Street street", "phone number": "555-5555"})
+            for i in range(count)]
+
     def test_add_record_csv(self):
         print("\nTesting add and getRecords with one record.  csv file")
         database = Database("test0Data", 'csv')
@@ -431,6 +835,120 @@ class T0_test_add_and_getRecords(unittest.TestCase):
         database.clean()
         print("OK\n")
 
+    def test_add_many_records_json(self):
+        print("\nTesting add and getRecords with several records. json file")
+        database = Database("test0Data", 'json')
+        database.clean()
+        records = self.sampleRecords()
+        for record in records:
+            database.add(record)
+        self.assertEqual(records, database.getRecords())
+        with open(database.dataFile) as f:
+            self.assertEqual({"records": records}, json.load(f))
+        database.clean()
+        print("OK\n")
+
+    def test_import_records(self):
+        print("\nTesting importRecords from a csv file into a json database")
+        source = Database("test.import.source", 'csv')
+        source.clean()
+        records = self.sampleRecords()
+        for record in records:
+            source.add(record)
+        database = Database("testImport", 'json')
+        database.clean()
+        database.add(records[0])
+        self.assertTrue(database.importRecords(source.dataFile))
+        self.assertEqual(records[:1] + records, database.getRecords())
+        self.assertFalse(database.importRecords("test.import.source.txt"))
+        source.clean()
+        self.assertFalse(database.importRecords(source.dataFile))
+        self.assertEqual(records[:1] + records, database.getRecords())
+        empty = Database("testImportEmpty", 'json')
+        empty.clean()
+        self.assertFalse(empty.importRecords(source.dataFile))
+        self.assertFalse(os.path.isfile(empty.dataFile))
+        source.clean()
+        database.clean()
+        print("OK\n")
+
+    def test_cached_records(self):
+        print("\nTesting getRecords stays current across adds from other databases")
+        database = Database("testCache", 'csv')
+        other = Database("testCache", 'csv')
+        database.clean()
+        records = self.sampleRecords()
+        database.add(records[0])
+        self.assertEqual(records[:1], database.getRecords())
+        database.add(records[1])
+        self.assertEqual(records[:2], database.getRecords())
+        other.add(records[2])
+        self.assertEqual(records, database.getRecords())
+        database.getRecords()[0]['name'] = "changed"
+        database.filter('name', 'John*')[0]['name'] = "changed"
+        database.filter('name', 'John Doe 0')[0]['name'] = "changed"
+        next(iter(database))['name'] = "changed"
+        self.assertEqual(records, database.getRecords())
+        self.assertEqual(1, len(database.filter('name', 'John Doe 0')))
+        database.clean()
+        self.assertEqual([], database.getRecords())
+        print("OK\n")
+
+    def test_cached_records_as_stored(self):
+        print("\nTesting cached records match what was written, whatever the key order or value types")
+        database = Database("testCacheStored", 'csv')
+        database.clean()
+        database.add(self.sampleRecords(1)[0])
+        database.getRecords()
+        database.add(Record({"phone number": 2, "name": "b", "address": "y"}))
+        database.add(Record({"name": "c"}))
+        fresh = Database("testCacheStored", 'csv')
+        self.assertEqual(fresh.getRecords(), database.getRecords())
+        self.assertEqual(fresh.filter('name', 'b'), database.filter('name', 'b'))
+        self.assertEqual([{"name": "b", "address": "y", "phone number": "2"}], database.filter('name', 'b'))
+        self.assertEqual([{"name": "c", "address": "", "phone number": ""}], database.filter('name', 'c'))
+        database.clean()
+        print("OK\n")
+
+    def test_convert(self):
+        print("\nTesting convert from csv to json and back")
+        database = Database("testConvert", 'csv')
+        database.clean()
+        records = self.sampleRecords()
+        for record in records:
+            database.add(record)
+        self.assertTrue(database.convert('json'))
+        self.assertFalse(os.path.isfile("testConvert.csv"))
+        self.assertEqual(records, Database("testConvert", 'json').getRecords())
+        self.assertTrue(database.convert('csv'))
+        self.assertEqual(records, database.getRecords())
+        database.clean()
+        print("OK\n")
+
+    def test_iterate(self):
+        print("\nTesting iterating over a database, with and without cached records")
+        records = self.sampleRecords()
+        for fileFormat in ('csv', 'json'):
+            database = Database("testIterate", fileFormat)
+            database.clean()
+            self.assertEqual([], list(database))
+            database.formats[fileFormat].writeMany(records, database.dataFile)
+            self.assertEqual(records, list(database))
+            database.getRecords()
+            self.assertEqual(records, list(database))
+            database.clean()
+        database = Database("testIterate", 'json')
+        numeric = [Record({"name": "a", "address": "x", "phone number": 1.5}),
+                   Record({"name": "b", "address": "y", "phone number": 2})]
+        database.formats['json'].writeMany(numeric, database.dataFile)
+        streamed = list(database)
+        self.assertEqual(numeric, streamed)
+        self.assertEqual([float, int], [type(r["phone number"]) for r in streamed])
+        database.getRecords()
+        self.assertEqual(streamed, list(database))
+        database.clean()
+        print("OK\n")
+
     def test_filter_user(self):
         print("\nTesting filter user")
         database = Database("testFilter", 'csv')
@@ -452,6 +970,108 @@ class T0_test_add_and_getRecords(unittest.TestCase):
         else:
             raise AssertionError
 
+    def test_filter_prefix_after_add(self):
+        print("\nTesting prefix filter picks up records added after the first search")
+        database = Database("testFilter", 'json')
+        database.clean()
+        for name in ["George Carlin", "John Doe"]:
+            database.add(Record(
+                {"name": name, "address": "123 Street street", "phone number": "555-5555"}))
+        for _ in range(database.scansBeforeIndex + 1):
+            self.assertEqual(
+                ["George Carlin"], [r['name'] for r in database.filter('name', 'Geo*')])
+        for name in ["Georgia", "Geo"]:
+            database.add(Record(
+                {"name": name, "address": "123 Street street", "phone number": "555-5555"}))
+        result = database.filter('name', 'Geo*')
+        self.assertEqual(["George Carlin", "Georgia", "Geo"], [r['name'] for r in result])
+        self.assertEqual([], database.filter('name', 'Gex*'))
+        database.clean()
+        print("OK\n")
+
+    def test_prefix_index(self):
+        print("\nTesting PrefixIndex lookups")
+        last = chr(sys.maxunicode)
+        index = PrefixIndex(["ab", "a" + last, "a" + last + "x", "b", "a"])
+        index.insert("aa")
+        self.assertEqual([0, 1, 2, 4, 5], index.find("a"))
+        self.assertEqual([1, 2], index.find("a" + last))
+        self.assertEqual([3], index.find("b"))
+        self.assertEqual([], index.find("c"))
+        print("OK\n")
+
+    def test_filter_exact_index(self):
+        print("\nTesting exact match filter before and after the category is indexed")
+        database = Database("testFilter", 'json')
+        database.clean()
+        for name in ["John Doe", "George Carlin", "John Doe"]:
+            database.add(Record(
+                {"name": name, "address": "123 Street street", "phone number": 5551234}))
+        for _ in range(database.scansBeforeIndex + 1):
+            self.assertEqual(2, len(database.filter('name', 'John Doe')))
+            self.assertEqual(3, len(database.filter('phone number', '5551234')))
+        database.add(Record(
+            {"name": "John Doe", "address": "742 Evergreen Terrace", "phone number": "555-1212"}))
+        self.assertEqual(3, len(database.filter('name', 'John Doe')))
+        self.assertEqual(1, len(database.filter('phone number', '555-1212')))
+        database.clean()
+        print("OK\n")
+
+    def test_import_missing_indexed_category(self):
+        print("\nTesting import of records lacking an indexed category")
+        source = Database("testImportPartial", 'json')
+        source.clean()
+        source.formats['json'].writeMany(
+            [Record({"name": "b", "address": "x", "phone number": "1"}), Record({"address": "y"})],
+            source.dataFile)
+        database = Database("testFilter", 'json')
+        database.clean()
+        database.add(Record({"name": "a", "address": "z", "phone number": "2"}))
+        for _ in range(database.scansBeforeIndex + 1):
+            self.assertEqual(1, len(database.filter('name', 'a')))
+        self.assertTrue(database.importRecords(source.dataFile))
+        database.add(Record({"name": "e", "address": "w", "phone number": "3"}))
+        self.assertEqual(["e"], [r.get('name') for r in database.filter('name', 'e')])
+        self.assertEqual(4, len(database.getRecords()))
+        source.clean()
+        database.clean()
+        print("OK\n")
+
+    def test_filter_list(self):
+        print("\nTesting filter with a comma separated list")
+        database = Database("testFilter", 'csv')
+        database.clean()
+        for name in ["John Doe", "George Carlin", "Homer"]:
+            database.add(Record(
+                {"name": name, "address": "123 Street street", "phone number": "555-5555"}))
+        result = database.filter('name', 'Homer, John Doe')
+        database.clean()
+        self.assertEqual(["John Doe", "Homer"], [record['name'] for record in result])
+        print("OK\n")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_csv_pyarrow(self):
+        print("\nTesting large csv files parse the same with pyarrow as with the csv module")
+        database = Database("testArrow", 'csv')
+        database.clean()
+        records = [Record(
+            {"name": f"Doe, \"John\" {i}", "address": "123 Street\nstreet" if i % 7 else "",
+             "phone number": f"{i:07d}"})
+            for i in range(3000)]
+        csvFormat = database.formats['csv']
+        csvFormat.writeMany(records, database.dataFile)
+        self.assertGreaterEqual(os.path.getsize(database.dataFile), ARROW_CSV_MIN_SIZE)
+        expected = list(csvFormat.iterRecords(database.dataFile))
+        self.assertEqual(records, expected)
+        self.assertEqual(expected, csvFormat.getRecords(database.dataFile))
+        self.assertIn("pyarrow.csv", sys.modules)
+        with open(database.dataFile, 'a') as f:
+            f.write("ragged,row\n")
+        self.assertEqual(
+            list(csvFormat.iterRecords(database.dataFile)), csvFormat.getRecords(database.dataFile))
+        database.clean()
+        print("OK\n")
+
     def test_display_text(self):
         """
         Tests the display function
@@ -474,18 +1094,21 @@ class T0_test_add_and_getRecords(unittest.TestCase):
     def test_display_html(self):
         """
         Tests the display function
-        TODO: test only checks for display file.  Add logic to verify contents.
         """
         print("\nTesting display html")
         database = Database("testDisplayHtml", 'csv')
         database.clean()
         record = Record(
-            {"name": "Homer", "address": "742 Evergreen Terrace", "phone number": "555-1212"})
+            {"name": "Homer", "address": "742 Evergreen <Terrace>", "phone number": "555-1212"})
         database.add(record)
         recordCheck = database.getRecords()
         Display.displayHtml(recordCheck)
         if not os.path.isfile('html_display.html'):
             raise AssertionError
+        with open('html_display.html') as f:
+            self.assertEqual(
+                "<ul><li>name: Homer</li><li>address: 742 Evergreen &lt;Terrace&gt;</li>"
+                "<li>phone number: 555-1212</li></ul><hr>", f.read())
         database.clean()
         os.remove('html_display.html')
         print("OK\n")